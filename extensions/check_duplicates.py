@@ -1,12 +1,68 @@
 import json
-from sqlalchemy import create_engine
-from trino.sqlalchemy import URL
-import pandas as pd
+import orjson
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal
+from trino.auth import BasicAuthentication
+from trino.dbapi import connect
 
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 from nifiapi.relationship import Relationship
 
+# Maximale Anzahl gebundener Parameter, bis zu der im Datenbankfilter verglichen wird
+MAX_PUSHDOWN_PARAMETERS = 10000
+
+# Abfragen mit ORDER BY oder LIMIT werden nicht auf die Vergleichsspalten reduziert
+SORTED_OR_LIMITED_QUERY = re.compile(r"\b(ORDER\s+BY|LIMIT)\b", re.IGNORECASE)
+
+# Nur SELECT- und WITH-Abfragen werden als Unterabfrage eingebettet, EXEC/CALL u. ä. bleiben unverändert
+SUBQUERY_STATEMENT = re.compile(r"(SELECT|WITH)\b", re.IGNORECASE)
+
+# Anzahl Zeilen, die je fetchmany-Aufruf vom Cursor abgeholt werden
+DBAPI_FETCH_SIZE = 10000
+
+
+def _key_value(value):
+    # DECIMAL wie früher pandas (coerce_float) als float vergleichen, damit 1.50 zu 1.5 passt
+    if isinstance(value, Decimal):
+        return str(float(value))
+    return str(value)
+
+
+def _subquery(sql):
+    # Abfrage auf eigenen Zeilen einbetten, damit ein abschließender "--"-Kommentar
+    # die schließende Klammer nicht auskommentiert
+    inner = sql.strip().rstrip(';')
+    # Weitere Semikolons (mehrere Anweisungen, ";" vor einem Kommentar) nicht umschreiben
+    if not SUBQUERY_STATEMENT.match(inner) or ';' in inner:
+        return None
+    return f"(\n{inner}\n) t"
+
+
+def _load_json(contents_bytes):
+    # Standardbibliothek statt orjson: orjson lehnt NaN/Infinity ab und wandelt
+    # Ganzzahlen außerhalb von 64 Bit stillschweigend in float um
+    non_finite = []
+
+    def parse_constant(name):
+        non_finite.append(name)
+        return float(name)
+
+    return json.loads(contents_bytes, parse_constant=parse_constant), bool(non_finite)
+
+
+def _dump_json(obj, has_non_finite=False):
+    # orjson schreibt NaN/Infinity als null und lehnt Ganzzahlen außerhalb von 64 Bit ab,
+    # solche Inhalte werden wie bisher mit der Standardbibliothek geschrieben
+    if not has_non_finite:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 
 class TrinoCheckDuplicates(FlowFileTransform):
 
@@ -19,7 +75,7 @@ class TrinoCheckDuplicates(FlowFileTransform):
             "Checks whether given flowfile content is already contained in database "
             "using SQL query and comparing provided columns"
         )
-        dependencies = ['trino', 'sqlalchemy', 'pandas']
+        dependencies = ['trino', 'orjson']
 
     TRINO_HOST = PropertyDescriptor(
         name="Trino Host",
@@ -79,6 +135,21 @@ class TrinoCheckDuplicates(FlowFileTransform):
         expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
     )
 
+    PUSHDOWN_FILTER = PropertyDescriptor(
+        name="Filter in database",
+        description=(
+            "Restricts the query to the mapped columns and the key values of the flowfile so that only "
+            "matching rows are returned by the database. Values are bound with their JSON types, so only "
+            "enable this when flowfile fields and database columns have compatible types. Flowfiles with "
+            "missing or null key fields are always compared in memory. If the restricted query fails, "
+            "e.g. for joins with duplicate column names, the original query is executed instead."
+        ),
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"],
+        validators=[StandardValidators.BOOLEAN_VALIDATOR]
+    )
+
     properties = [
         TRINO_HOST,
         TRINO_PORT,
@@ -86,15 +157,34 @@ class TrinoCheckDuplicates(FlowFileTransform):
         TRINO_USER,
         TRINO_PASSWORD,
         SQL_QUERY,
-        COLUMN_MAPPING
+        COLUMN_MAPPING,
+        PUSHDOWN_FILTER
     ]
 
     def __init__(self, **kwargs):
-        pass
+        # Trino-Verbindungen je Verbindungsparametern, über Flowfiles hinweg wiederverwendet
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        # Führt Datenbankabfragen parallel zum Lesen des Flowfile-Inhalts aus,
+        # lebt von onScheduled bis onStopped
+        self._executor = None
 
     def getPropertyDescriptors(self):
         return self.properties
 
+    def onScheduled(self, context):
+        self._executor = ThreadPoolExecutor(thread_name_prefix="TrinoCheckDuplicates")
+
+    def onStopped(self, context):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with self._connections_lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
     def getRelationships(self):
         return {
             Relationship("success", description="Flowfiles that are not duplicates are routed to this relationship"),
@@ -103,61 +193,156 @@ class TrinoCheckDuplicates(FlowFileTransform):
 
     def transform(self, context, flowfile):
 
-        contents_bytes = flowfile.getContentsAsBytes()
-        contents = contents_bytes.decode('utf-8')
-        flow_data = json.loads(contents)
+        def _get(descriptor):
+            return context.getProperty(descriptor).evaluateAttributeExpressions(flowfile).getValue()
 
-        if isinstance(flow_data, dict):
-            flow_data = [flow_data]
+        sql = _get(self.SQL_QUERY)
+        column_mapping = orjson.loads(_get(self.COLUMN_MAPPING))
+        pushdown = context.getProperty(self.PUSHDOWN_FILTER).asBoolean()
 
-        sql = context.getProperty(self.SQL_QUERY).evaluateAttributeExpressions(flowfile).getValue()
-        column_mapping = json.loads(
-            context.getProperty(self.COLUMN_MAPPING)
-            .evaluateAttributeExpressions(flowfile)
-            .getValue()
+        connection = self._get_connection(
+            host=_get(self.TRINO_HOST),
+            port=int(_get(self.TRINO_PORT)),
+            catalog=_get(self.TRINO_CATALOG),
+            user=_get(self.TRINO_USER),
+            password=_get(self.TRINO_PASSWORD)
         )
 
-        engine = create_engine(
-            URL(
-                host=context.getProperty(self.TRINO_HOST).evaluateAttributeExpressions(flowfile).getValue(),
-                port=context.getProperty(self.TRINO_PORT).evaluateAttributeExpressions(flowfile).getValue(),
-                catalog=context.getProperty(self.TRINO_CATALOG).evaluateAttributeExpressions(flowfile).getValue(),
-                user=context.getProperty(self.TRINO_USER).evaluateAttributeExpressions(flowfile).getValue(),
-                password=context.getProperty(self.TRINO_PASSWORD).evaluateAttributeExpressions(flowfile).getValue()
-            )
-        )
-        with engine.connect() as connection:
-            df = pd.read_sql_query(sql, connection)
-        db_rows = df.to_dict(orient='records')
+        # Ohne Datenbankfilter hängt die Abfrage nicht vom Inhalt ab und läuft bereits,
+        # während der Flowfile-Inhalt gelesen und geparst wird
+        future = None
+        if not pushdown:
+            future = self._executor.submit(self._query_db_index, connection, sql, column_mapping)
 
-        non_duplicates = []
-        duplicates = []
+        try:
+            contents_bytes = flowfile.getContentsAsBytes()
+            flow_data, has_non_finite = _load_json(contents_bytes)
+        except BaseException:
+            # Abfrage nicht verwaist weiterlaufen lassen: abbrechen oder auf ihr Ende warten
+            if future is not None and not future.cancel():
+                wait([future])
+            raise
 
-        for item in flow_data:
-            is_duplicate = False
+        if isinstance(flow_data, dict):
+            flow_data = [flow_data]
 
-            for db_row in db_rows:
-                if all(
-                        str(item.get(flow_col)) == str(db_row.get(db_col))
-                        for flow_col, db_col in column_mapping.items()
-                ):
-                    is_duplicate = True
-                    duplicates.append(item)
-                    break
+        if future is not None:
+            db_index = future.result()
+        else:
+            db_index = self._query_db_index(connection, sql, column_mapping, flow_data)
 
-            if not is_duplicate:
-                non_duplicates.append(item)
+        duplicates, non_duplicates = self._split_duplicates(flow_data, db_index, column_mapping)
 
         if non_duplicates:
             return FlowFileTransformResult(
                 relationship="success",
-                contents=json.dumps(non_duplicates)
+                contents=_dump_json(non_duplicates, has_non_finite)
             )
         
         if duplicates:
             return FlowFileTransformResult(
                 relationship="duplicate",
-                contents=json.dumps(duplicates)
+                contents=_dump_json(duplicates, has_non_finite)
             )
 
         return None
+
+    def _get_connection(self, host, port, catalog, user, password):
+        key = (host, port, catalog, user, password)
+        with self._connections_lock:
+            connection = self._connections.get(key)
+            if connection is None:
+                connection = connect(
+                    host=host,
+                    port=port,
+                    catalog=catalog,
+                    user=user,
+                    http_scheme="https" if password else None,
+                    auth=BasicAuthentication(user, password) if password else None
+                )
+                self._connections[key] = connection
+        return connection
+
+    def _query_db_index(self, connection, sql, column_mapping, flow_data=None):
+        # Ohne Datenbankfilter läuft die Abfrage unverändert
+        if flow_data is None:
+            return self._fetch_db_index(connection, sql, None, column_mapping)
+
+        if (
+            flow_data
+            and column_mapping
+            and len(flow_data) * len(column_mapping) <= MAX_PUSHDOWN_PARAMETERS
+            and self._has_complete_keys(flow_data, column_mapping)
+            and _subquery(sql) is not None
+        ):
+            rewritten_sql, params = self._build_pushdown_query(sql, flow_data, column_mapping)
+        else:
+            rewritten_sql, params = self._project_query(sql, column_mapping), None
+        if rewritten_sql == sql:
+            return self._fetch_db_index(connection, sql, None, column_mapping)
+
+        try:
+            return self._fetch_db_index(connection, rewritten_sql, params, column_mapping)
+        except Exception as e:
+            # Nicht jede Abfrage ist als Unterabfrage gültig, z. B. Joins mit doppelten Spaltennamen
+            self.logger.warn(f"Filtered query failed, falling back to the original query: {e}")
+            return self._fetch_db_index(connection, sql, None, column_mapping)
+
+    def _fetch_db_index(self, connection, sql, params, column_mapping):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql, params)
+
+            # Positionen der Vergleichsspalten im Ergebnis bestimmen
+            columns = [desc[0] for desc in cursor.description]
+            col_idx = [columns.index(db_col) for db_col in column_mapping.values()]
+
+            # Schlüssel blockweise direkt aus dem Cursor aufbauen, ohne DataFrame oder Dicts
+            cursor.arraysize = DBAPI_FETCH_SIZE
+            db_index = set()
+            while True:
+                batch = cursor.fetchmany()
+                if not batch:
+                    break
+                db_index.update(tuple(_key_value(row[i]) for i in col_idx) for row in batch)
+        finally:
+            cursor.close()
+        return db_index
+
+    def _project_query(self, sql, column_mapping, quote='"'):
+        db_cols = list(dict.fromkeys(column_mapping.values()))
+        subquery = _subquery(sql)
+        if not db_cols or subquery is None or SORTED_OR_LIMITED_QUERY.search(sql):
+            return sql
+        # Abfrage liefert bereits genau die benötigten Spalten
+        if " ".join(sql.split()).upper().startswith(f"SELECT {', '.join(db_cols)} FROM".upper()):
+            return sql
+        needed = ", ".join(f"{quote}{db_col}{quote}" for db_col in db_cols)
+        return f"SELECT {needed} FROM {subquery}"
+
+    def _has_complete_keys(self, flow_data, column_mapping):
+        # NULL matcht in IN (...) nie, im Speicher gilt 'None' == 'None' aber als Duplikat
+        return all(item.get(flow_col) is not None for item in flow_data for flow_col in column_mapping)
+
+    def _build_pushdown_query(self, sql, flow_data, column_mapping, quote='"'):
+        db_cols = ", ".join(f"t.{quote}{db_col}{quote}" for db_col in column_mapping.values())
+        placeholders = "(" + ", ".join("?" for _ in column_mapping) + ")"
+        pushdown_sql = (
+            f"SELECT {db_cols} FROM {_subquery(sql)} "
+            f"WHERE ({db_cols}) IN ({', '.join(placeholders for _ in flow_data)})"
+        )
+        params = [item.get(flow_col) for item in flow_data for flow_col in column_mapping]
+        return pushdown_sql, params
+
+    def _split_duplicates(self, flow_data, db_index, column_mapping):
+        flow_cols = list(column_mapping)
+        item_keys = [tuple(str(item.get(flow_col)) for flow_col in flow_cols) for item in flow_data]
+
+        duplicates = []
+        non_duplicates = []
+        for item, key in zip(flow_data, item_keys):
+            if key in db_index:
+                duplicates.append(item)
+            else:
+                non_duplicates.append(item)
+        return duplicates, non_duplicates
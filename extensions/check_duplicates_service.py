@@ -1,10 +1,58 @@
 import json
-import pandas as pd
+import orjson
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 from nifiapi.relationship import Relationship
 
+# Maximale Anzahl gebundener Parameter, bis zu der im Datenbankfilter verglichen wird
+MAX_PUSHDOWN_PARAMETERS = 1000
+
+# Abfragen mit ORDER BY oder LIMIT werden nicht auf die Vergleichsspalten reduziert
+SORTED_OR_LIMITED_QUERY = re.compile(r"\b(ORDER\s+BY|LIMIT)\b", re.IGNORECASE)
+
+# Nur SELECT-Abfragen werden als Unterabfrage eingebettet; EXEC/CALL und CTEs
+# (SQL Server erlaubt WITH nicht in Unterabfragen) bleiben unverändert
+SUBQUERY_STATEMENT = re.compile(r"SELECT\b", re.IGNORECASE)
+
+# Anzahl Zeilen, die der JDBC-Treiber je Roundtrip vorab lädt
+JDBC_FETCH_SIZE = 5000
+
+
+def _subquery(sql):
+    # Abfrage auf eigenen Zeilen einbetten, damit ein abschließender "--"-Kommentar
+    # die schließende Klammer nicht auskommentiert
+    inner = sql.strip().rstrip(';')
+    # Weitere Semikolons (mehrere Anweisungen, ";" vor einem Kommentar) nicht umschreiben
+    if not SUBQUERY_STATEMENT.match(inner) or ';' in inner:
+        return None
+    return f"(\n{inner}\n) t"
+
+
+def _load_json(contents_bytes):
+    # Standardbibliothek statt orjson: orjson lehnt NaN/Infinity ab und wandelt
+    # Ganzzahlen außerhalb von 64 Bit stillschweigend in float um
+    non_finite = []
+
+    def parse_constant(name):
+        non_finite.append(name)
+        return float(name)
+
+    return json.loads(contents_bytes, parse_constant=parse_constant), bool(non_finite)
+
+
+def _dump_json(obj, has_non_finite=False):
+    # orjson schreibt NaN/Infinity als null und lehnt Ganzzahlen außerhalb von 64 Bit ab,
+    # solche Inhalte werden wie bisher mit der Standardbibliothek geschrieben
+    if not has_non_finite:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
 
 class CheckDuplicates(FlowFileTransform):
 
@@ -17,11 +65,14 @@ class CheckDuplicates(FlowFileTransform):
             "Checks whether given flowfile content is already contained in database "
             "using SQL query and comparing provided columns. Uses a DBCPConnectionPool."
         )
-        dependencies = ['pandas']
+        dependencies = ['orjson']
 
     DBCP_SERVICE = PropertyDescriptor(
         name="Database Connection Pool Service",
-        description="The Controller Service that is used to obtain a connection to the database.",
+        description=(
+            "The Controller Service that is used to obtain a connection to the database. "
+            "Its maximum number of connections should be at least the number of concurrent tasks."
+        ),
         required=True,
         controller_service_definition="org.apache.nifi.dbcp.DBCPService"
     )
@@ -43,18 +94,44 @@ class CheckDuplicates(FlowFileTransform):
         expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
     )
 
+    PUSHDOWN_FILTER = PropertyDescriptor(
+        name="Filter in database",
+        description=(
+            "Restricts the query to the mapped columns and the key values of the flowfile so that only "
+            "matching rows are returned by the database. Values are bound with their JSON types, so only "
+            "enable this when flowfile fields and database columns have compatible types. Flowfiles with "
+            "missing or null key fields are always compared in memory. If the restricted query fails, "
+            "e.g. for joins with duplicate column names, the original query is executed instead."
+        ),
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"],
+        validators=[StandardValidators.BOOLEAN_VALIDATOR]
+    )
+
     properties = [
         DBCP_SERVICE,
         SQL_QUERY,
-        COLUMN_MAPPING
+        COLUMN_MAPPING,
+        PUSHDOWN_FILTER
     ]
 
     def __init__(self, **kwargs):
-        pass
+        # Führt Datenbankabfragen parallel zum Lesen des Flowfile-Inhalts aus,
+        # lebt von onScheduled bis onStopped
+        self._executor = None
 
     def getPropertyDescriptors(self):
         return self.properties
 
+    def onScheduled(self, context):
+        self._executor = ThreadPoolExecutor(thread_name_prefix="CheckDuplicates")
+
+    def onStopped(self, context):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
     def getRelationships(self):
         return {
             Relationship("success", description="Flowfiles that are not duplicates are routed to this relationship"),
@@ -63,78 +140,147 @@ class CheckDuplicates(FlowFileTransform):
 
     def transform(self, context, flowfile):
 
-        contents_bytes = flowfile.getContentsAsBytes()
-        contents = contents_bytes.decode('utf-8')
-        flow_data = json.loads(contents)
-
-        if isinstance(flow_data, dict):
-            flow_data = [flow_data]
+        def _get(descriptor):
+            return context.getProperty(descriptor).evaluateAttributeExpressions(flowfile).getValue()
 
-        sql = context.getProperty(self.SQL_QUERY).evaluateAttributeExpressions(flowfile).getValue()
-        column_mapping = json.loads(
-            context.getProperty(self.COLUMN_MAPPING)
-            .evaluateAttributeExpressions(flowfile)
-            .getValue()
-        )
+        sql = _get(self.SQL_QUERY)
+        column_mapping = orjson.loads(_get(self.COLUMN_MAPPING))
+        pushdown = context.getProperty(self.PUSHDOWN_FILTER).asBoolean()
 
         dbcp_service = context.getProperty(self.DBCP_SERVICE).asControllerService()
-        conn = dbcp_service.getConnection()
-        try:
-            stmt = conn.prepareStatement(sql)
-            try:
-                rs = stmt.executeQuery()
-                try:
-                    # Spaltennamen extrahieren
-                    meta = rs.getMetaData()
-                    col_count = meta.getColumnCount()
-                    columns = [meta.getColumnLabel(i + 1) for i in range(col_count)]
-                    
-                    # Daten extrahieren
-                    rows = []
-                    while rs.next():
-                        row = []
-                        for i in range(col_count):
-                            row.append(rs.getObject(i + 1))
-                        rows.append(row)
-                    
-                    df = pd.DataFrame(rows, columns=columns)
-                finally:
-                    rs.close()
-            finally:
-                stmt.close()
-        finally:
-            conn.close()
 
-        db_rows = df.to_dict(orient='records')
+        # Ohne Datenbankfilter hängt die Abfrage nicht vom Inhalt ab und läuft bereits,
+        # während der Flowfile-Inhalt gelesen und geparst wird
+        future = None
+        if not pushdown:
+            future = self._executor.submit(self._query_db_index, dbcp_service, sql, column_mapping)
 
-        non_duplicates = []
-        duplicates = []
+        try:
+            contents_bytes = flowfile.getContentsAsBytes()
+            flow_data, has_non_finite = _load_json(contents_bytes)
+        except BaseException:
+            # Abfrage nicht verwaist weiterlaufen lassen: abbrechen oder auf ihr Ende warten
+            if future is not None and not future.cancel():
+                wait([future])
+            raise
 
-        for item in flow_data:
-            is_duplicate = False
+        if isinstance(flow_data, dict):
+            flow_data = [flow_data]
 
-            for db_row in db_rows:
-                if all(
-                        str(item.get(flow_col)) == str(db_row.get(db_col))
-                        for flow_col, db_col in column_mapping.items()
-                ):
-                    is_duplicate = True
-                    duplicates.append(item)
-                    break
+        if future is not None:
+            db_index = future.result()
+        else:
+            db_index = self._query_db_index(dbcp_service, sql, column_mapping, flow_data)
 
-            if not is_duplicate:
-                non_duplicates.append(item)
+        duplicates, non_duplicates = self._split_duplicates(flow_data, db_index, column_mapping)
 
         if non_duplicates:
             return FlowFileTransformResult(
                 relationship="success",
-                contents=json.dumps(non_duplicates)
+                contents=_dump_json(non_duplicates, has_non_finite)
             )
         
         if duplicates:
             return FlowFileTransformResult(
                 relationship="duplicate",
-                contents=json.dumps(duplicates)
+                contents=_dump_json(duplicates, has_non_finite)
             )
 
         return None
+
+    def _query_db_index(self, dbcp_service, sql, column_mapping, flow_data=None):
+        conn = dbcp_service.getConnection()
+        try:
+            # Ohne Datenbankfilter läuft die Abfrage unverändert
+            if flow_data is None:
+                return self._fetch_db_index(conn, sql, [], column_mapping)
+
+            # Bezeichner im Dialekt der Datenbank quotieren (" " = nicht unterstützt)
+            quote = conn.getMetaData().getIdentifierQuoteString().strip()
+            if (
+                flow_data
+                and column_mapping
+                and len(flow_data) * len(column_mapping) <= MAX_PUSHDOWN_PARAMETERS
+                and self._has_complete_keys(flow_data, column_mapping)
+                and _subquery(sql) is not None
+            ):
+                rewritten_sql, params = self._build_pushdown_query(sql, flow_data, column_mapping, quote)
+            else:
+                rewritten_sql, params = self._project_query(sql, column_mapping, quote), []
+            if rewritten_sql == sql:
+                return self._fetch_db_index(conn, sql, [], column_mapping)
+
+            try:
+                return self._fetch_db_index(conn, rewritten_sql, params, column_mapping)
+            except Exception as e:
+                # Nicht jede Abfrage ist als Unterabfrage gültig, z. B. Joins mit doppelten Spaltennamen
+                # oder unbenannte Ausdrucksspalten (SQL Server)
+                self.logger.warn(f"Filtered query failed, falling back to the original query: {e}")
+                if not conn.getAutoCommit():
+                    conn.rollback()
+                return self._fetch_db_index(conn, sql, [], column_mapping)
+        finally:
+            conn.close()
+
+    def _fetch_db_index(self, conn, sql, params, column_mapping):
+        stmt = conn.prepareStatement(sql)
+        try:
+            for i, value in enumerate(params):
+                stmt.setObject(i + 1, value)
+            stmt.setFetchSize(JDBC_FETCH_SIZE)
+            rs = stmt.executeQuery()
+            try:
+                # Spaltennamen extrahieren
+                meta = rs.getMetaData()
+                columns = [meta.getColumnLabel(i + 1) for i in range(meta.getColumnCount())]
+
+                # Schlüssel der Vergleichsspalten direkt über ihre Position aufbauen
+                positions = [columns.index(db_col) + 1 for db_col in column_mapping.values()]
+                db_index = set()
+                while rs.next():
+                    db_index.add(tuple(str(rs.getObject(position)) for position in positions))
+            finally:
+                rs.close()
+        finally:
+            stmt.close()
+        return db_index
+
+    def _project_query(self, sql, column_mapping, quote='"'):
+        db_cols = list(dict.fromkeys(column_mapping.values()))
+        subquery = _subquery(sql)
+        if not db_cols or subquery is None or SORTED_OR_LIMITED_QUERY.search(sql):
+            return sql
+        # Abfrage liefert bereits genau die benötigten Spalten
+        if " ".join(sql.split()).upper().startswith(f"SELECT {', '.join(db_cols)} FROM".upper()):
+            return sql
+        needed = ", ".join(f"{quote}{db_col}{quote}" for db_col in db_cols)
+        return f"SELECT {needed} FROM {subquery}"
+
+    def _has_complete_keys(self, flow_data, column_mapping):
+        # NULL matcht in IN (...) nie, im Speicher gilt 'None' == 'None' aber als Duplikat
+        return all(item.get(flow_col) is not None for item in flow_data for flow_col in column_mapping)
+
+    def _build_pushdown_query(self, sql, flow_data, column_mapping, quote='"'):
+        db_cols = [f"t.{quote}{db_col}{quote}" for db_col in column_mapping.values()]
+        # Zeilenwerte wie (a, b) IN ((?, ?), ...) unterstützt nicht jeder Dialekt (z. B. SQL Server)
+        if len(db_cols) == 1:
+            condition = f"{db_cols[0]} IN ({', '.join('?' for _ in flow_data)})"
+        else:
+            key_condition = "(" + " AND ".join(f"{db_col} = ?" for db_col in db_cols) + ")"
+            condition = " OR ".join(key_condition for _ in flow_data)
+        pushdown_sql = f"SELECT {', '.join(db_cols)} FROM {_subquery(sql)} WHERE {condition}"
+        params = [item.get(flow_col) for item in flow_data for flow_col in column_mapping]
+        return pushdown_sql, params
+
+    def _split_duplicates(self, flow_data, db_index, column_mapping):
+        flow_cols = list(column_mapping)
+        item_keys = [tuple(str(item.get(flow_col)) for flow_col in flow_cols) for item in flow_data]
+
+        duplicates = []
+        non_duplicates = []
+        for item, key in zip(flow_data, item_keys):
+            if key in db_index:
+                duplicates.append(item)
+            else:
+                non_duplicates.append(item)
+        return duplicates, non_duplicates
@@ -1,9 +1,67 @@
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 import json
-from pyproj import Transformer
+import orjson
+from functools import lru_cache
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
 from shapely.geometry import shape
-from shapely.wkt import dumps as wkt_dumps
+
+
+@lru_cache(maxsize=32)
+def _normalize_crs(crs):
+    return CRS.from_user_input(crs.strip()).to_authority() or crs.strip().upper()
+
+
+@lru_cache(maxsize=32)
+def _get_transformer(source_crs, target_crs):
+    # None, wenn beide Koordinatensysteme gleichwertig sind
+    if _normalize_crs(source_crs) == _normalize_crs(target_crs):
+        return None
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def _load_json(contents_bytes):
+    # Standardbibliothek statt orjson: orjson lehnt NaN/Infinity ab und wandelt
+    # Ganzzahlen außerhalb von 64 Bit stillschweigend in float um
+    non_finite = []
+
+    def parse_constant(name):
+        non_finite.append(name)
+        return float(name)
+
+    return json.loads(contents_bytes, parse_constant=parse_constant), bool(non_finite)
+
+
+def _dump_json(obj, has_non_finite=False):
+    # orjson schreibt NaN/Infinity als null und lehnt Ganzzahlen außerhalb von 64 Bit ab,
+    # solche Inhalte werden wie bisher mit der Standardbibliothek geschrieben
+    if not has_non_finite:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _to_geometries(geometries, has_non_finite=False):
+    # GEOS' GeoJSON-Leser kennt kein NaN/Infinity, dann über shapely.geometry.shape parsen
+    if has_non_finite:
+        return np.array([shape(geometry) for geometry in geometries], dtype=object)
+    geoms = shapely.from_geojson(
+        np.array([_dump_json(geometry) for geometry in geometries], dtype=object), on_invalid='ignore'
+    )
+    # Was GEOS ablehnt (z. B. "type": "point") oder mit NaN auffüllt (gemischte Dimensionen),
+    # wie bisher über shape() parsen, damit es dort akzeptiert bzw. abgelehnt wird
+    fallback = shapely.is_missing(geoms)
+    coords, index = shapely.get_coordinates(geoms, include_z=True, return_index=True)
+    has_nan = np.isnan(coords[:, :2]).any(axis=1) | (np.isnan(coords[:, 2]) & shapely.has_z(geoms)[index])
+    fallback[index[has_nan]] = True
+    for i in np.flatnonzero(fallback):
+        geoms[i] = shape(geometries[i])
+    return geoms
+
 
 class GeoJSONTransform(FlowFileTransform):
     class Java:
@@ -12,7 +70,7 @@ class GeoJSONTransform(FlowFileTransform):
     class ProcessorDetails:
         version = "1.0.0"
         description = "Transforms GeoJSON column to WKT with coordinate system transformation"
-        dependencies = ['pyproj', 'shapely']
+        dependencies = ['pyproj', 'shapely>=2.0', 'numpy', 'orjson']
 
     SOURCE_CRS = PropertyDescriptor(
         name="Source Coordinate System",
@@ -42,60 +100,65 @@ class GeoJSONTransform(FlowFileTransform):
     def transform(self, context, flowfile):
         try:
             target_crs = context.getProperty(self.TARGET_CRS).evaluateAttributeExpressions(flowfile).getValue()
+            configured_crs = context.getProperty(self.SOURCE_CRS).evaluateAttributeExpressions(flowfile).getValue()
 
             contents_bytes = flowfile.getContentsAsBytes()
-            contents = contents_bytes.decode('utf-8')
-            data = json.loads(contents)
+            data, has_non_finite = _load_json(contents_bytes)
+
+            source_crs = self._resolve_source_crs(configured_crs, data)
+            transformer = _get_transformer(source_crs, target_crs)
 
             # Check if it's a FeatureCollection
             if data.get('type') == 'FeatureCollection':
                 features = data.get('features', [])
-                source_crs = context.getProperty(self.SOURCE_CRS).evaluateAttributeExpressions(flowfile).getValue()
-                source_crs = source_crs or data.get('crs', {}).get('properties', {}).get('name', 'EPSG:4326')
-                if 'EPSG' not in source_crs.upper():
-                    source_crs = 'EPSG:4326'
-
-                # Flatten features into list of objects
-                flattened = []
-                for feature in features:
-                    if 'geometry' in feature:
-                        geom = shape(feature['geometry'])
-
-                        if source_crs.upper() != target_crs.upper():
-                            transformer = Transformer.from_crs(source_crs, target_crs, always_xy=True)
-                            geom = self._transform_geometry(geom, transformer)
-
-                        # Create flattened object
-                        flat_obj = {
-                            'geometry': feature['geometry']
-                        }
-                        # Add all properties at root level
-                        if 'properties' in feature:
-                            flat_obj.update(feature['properties'])
-                        # Add WKT
-                        flat_obj['wkt'] = wkt_dumps(geom)
-
-                        flattened.append(flat_obj)
-
-                result_contents = json.dumps(flattened, ensure_ascii=False)
+                geo_features = [feature for feature in features if 'geometry' in feature]
+                geoms = _to_geometries([feature['geometry'] for feature in geo_features], has_non_finite)
+
+                # Features mit eigenem CRS (selten) gruppenweise transformieren
+                if any('crs' in feature for feature in geo_features):
+                    feature_crs = np.array([
+                        self._resolve_source_crs(configured_crs, feature, source_crs)
+                        for feature in geo_features
+                    ], dtype=object)
+                    for crs in set(feature_crs):
+                        feature_transformer = _get_transformer(crs, target_crs)
+                        if feature_transformer is not None:
+                            mask = feature_crs == crs
+                            geoms[mask] = self._transform_geometries(geoms[mask], feature_transformer)
+                elif transformer is not None:
+                    geoms = self._transform_geometries(geoms, transformer)
+
+                wkts = shapely.to_wkt(geoms, rounding_precision=-1, trim=False)
+
+                # Flatten features and serialize them one by one
+                result_contents = bytearray(b'[')
+                for i, (feature, wkt) in enumerate(zip(geo_features, wkts)):
+                    # Create flattened object
+                    flat_obj = {
+                        'geometry': feature['geometry']
+                    }
+                    # Add all properties at root level
+                    if 'properties' in feature:
+                        flat_obj.update(feature['properties'])
+                    # Add WKT
+                    flat_obj['wkt'] = wkt
+
+                    if i:
+                        result_contents += b','
+                    result_contents += _dump_json(flat_obj, has_non_finite)
+                result_contents += b']'
 
             # Single geometry or Feature
             else:
-                geom = shape(data.get('geometry', data))
-
-                source_crs = context.getProperty(self.SOURCE_CRS).evaluateAttributeExpressions(flowfile).getValue()
-                source_crs = source_crs or data.get('crs', {}).get('properties', {}).get('name', 'EPSG:4326')
-                if 'EPSG' not in source_crs.upper():
-                    source_crs = 'EPSG:4326'
+                geom = _to_geometries([data.get('geometry', data)], has_non_finite)[0]
 
-                if source_crs.upper() != target_crs.upper():
-                    transformer = Transformer.from_crs(source_crs, target_crs, always_xy=True)
-                    geom = self._transform_geometry(geom, transformer)
+                if transformer is not None:
+                    geom = self._transform_geometries(np.array([geom], dtype=object), transformer)[0]
 
-                wkt = wkt_dumps(geom)
+                wkt = shapely.to_wkt(geom, rounding_precision=-1, trim=False)
                 data['wkt'] = wkt
 
-                result_contents = json.dumps(data, ensure_ascii=False)
+                result_contents = _dump_json(data, has_non_finite)
 
             return FlowFileTransformResult(
                 relationship="success",
@@ -111,6 +174,19 @@ class GeoJSONTransform(FlowFileTransform):
                 contents=error_details
             )
 
-    def _transform_geometry(self, geom, transformer):
-        from shapely.ops import transform
-        return transform(transformer.transform, geom)
\ No newline at end of file
+    def _resolve_source_crs(self, configured_crs, obj, default='EPSG:4326'):
+        source_crs = configured_crs or obj.get('crs', {}).get('properties', {}).get('name', default)
+        if 'EPSG' not in source_crs.upper():
+            source_crs = 'EPSG:4326'
+        return source_crs
+
+    def _transform_geometries(self, geoms, transformer):
+        # Koordinaten je Dimension in einem vektorisierten PROJ-Aufruf transformieren;
+        # 2D-Geometrien dürfen kein (NaN-)z erhalten, sonst liefert PROJ NaN für x/y
+        has_z = shapely.has_z(geoms)
+        for mask, include_z in ((~has_z, False), (has_z, True)):
+            if mask.any():
+                coords = shapely.get_coordinates(geoms[mask], include_z=include_z)
+                transformed = transformer.transform(*coords.T)
+                geoms[mask] = shapely.set_coordinates(geoms[mask], np.column_stack(transformed))
+        return geoms
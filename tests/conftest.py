@@ -0,0 +1,61 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "extensions"))
+
+
+def _install_nifiapi_stub():
+    # Minimaler Ersatz für die nifiapi, die nur innerhalb von NiFi verfügbar ist
+    class FlowFileTransform:
+        pass
+
+    class FlowFileTransformResult:
+        def __init__(self, relationship, contents=None, attributes=None):
+            self.relationship = relationship
+            self.contents = contents
+            self.attributes = attributes
+
+    class PropertyDescriptor:
+        def __init__(self, name, **kwargs):
+            self.name = name
+            for key, value in kwargs.items():
+                setattr(self, key, value)
+
+    class StandardValidators:
+        NON_EMPTY_VALIDATOR = "NON_EMPTY_VALIDATOR"
+        BOOLEAN_VALIDATOR = "BOOLEAN_VALIDATOR"
+
+    class ExpressionLanguageScope:
+        NONE = "NONE"
+        ENVIRONMENT = "ENVIRONMENT"
+        FLOWFILE_ATTRIBUTES = "FLOWFILE_ATTRIBUTES"
+
+    class Relationship:
+        def __init__(self, name, description=None):
+            self.name = name
+            self.description = description
+
+    modules = {
+        "nifiapi": {},
+        "nifiapi.flowfiletransform": {
+            "FlowFileTransform": FlowFileTransform,
+            "FlowFileTransformResult": FlowFileTransformResult,
+        },
+        "nifiapi.properties": {
+            "PropertyDescriptor": PropertyDescriptor,
+            "StandardValidators": StandardValidators,
+            "ExpressionLanguageScope": ExpressionLanguageScope,
+        },
+        "nifiapi.relationship": {"Relationship": Relationship},
+    }
+    for name, attributes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+try:
+    import nifiapi  # noqa: F401
+except ImportError:
+    _install_nifiapi_stub()
@@ -0,0 +1,217 @@
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("orjson")
+pytest.importorskip("trino")
+
+from check_duplicates import TrinoCheckDuplicates, _subquery  # noqa: E402
+
+
+class FakeLogger:
+
+    def __init__(self):
+        self.warnings = []
+
+    def warn(self, message):
+        self.warnings.append(message)
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.arraysize = 1
+        self.description = None
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.connection.queries.append((sql, params))
+        if self.connection.fails(sql):
+            raise RuntimeError("Column 'id' is ambiguous")
+        self.description = [(column,) for column in self.connection.columns]
+        self.rows = list(self.connection.rows)
+
+    def fetchmany(self):
+        batch, self.rows = self.rows[:self.arraysize], self.rows[self.arraysize:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, columns, rows, fails=lambda sql: False):
+        self.columns = columns
+        self.rows = rows
+        self.fails = fails
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+@pytest.fixture
+def processor():
+    processor = TrinoCheckDuplicates()
+    processor.logger = FakeLogger()
+    return processor
+
+
+def test_subquery_keeps_trailing_comment_on_its_own_line():
+    assert _subquery("SELECT * FROM t -- letzter Stand\n") == "(\nSELECT * FROM t -- letzter Stand\n) t"
+
+
+def test_subquery_strips_trailing_semicolon():
+    assert _subquery("SELECT * FROM t;") == "(\nSELECT * FROM t\n) t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE name = 'a;b'",
+    "SELECT * FROM t; -- Kommentar",
+    "CALL system.sync_partition_metadata('s', 't', 'FULL')",
+    "EXECUTE stmt",
+])
+def test_subquery_leaves_other_statements_unchanged(sql):
+    assert _subquery(sql) is None
+
+
+def test_subquery_wraps_with_queries():
+    sql = "WITH c AS (SELECT * FROM t) SELECT * FROM c"
+    assert _subquery(sql) == f"(\n{sql}\n) t"
+
+
+def test_project_query_selects_mapped_columns_once(processor):
+    sql = "SELECT * FROM t -- Kommentar"
+    projected = processor._project_query(sql, {"a": "id", "b": "id", "c": "name"})
+    assert projected == 'SELECT "id", "name" FROM (\nSELECT * FROM t -- Kommentar\n) t'
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t ORDER BY id",
+    "SELECT * FROM t LIMIT 10",
+    "SELECT id, name FROM t",
+    "CALL system.sync_partition_metadata('s', 't', 'FULL')",
+])
+def test_project_query_leaves_query_unchanged(processor, sql):
+    assert processor._project_query(sql, {"a": "id", "b": "name"}) == sql
+
+
+def test_query_db_index_without_filter_runs_query_unchanged(processor):
+    connection = FakeConnection(["id", "name"], [(1, "x"), (2, "y")])
+
+    db_index = processor._query_db_index(connection, "SELECT * FROM t", {"a": "id"})
+
+    assert db_index == {("1",), ("2",)}
+    assert connection.queries == [("SELECT * FROM t", None)]
+
+
+def test_query_db_index_projects_query_with_filter(processor):
+    connection = FakeConnection(["id"], [(1,)])
+
+    db_index = processor._query_db_index(connection, "SELECT * FROM t", {"a": "id"}, [])
+
+    assert db_index == {("1",)}
+    assert connection.queries == [('SELECT "id" FROM (\nSELECT * FROM t\n) t', None)]
+    assert processor.logger.warnings == []
+
+
+def test_query_db_index_falls_back_to_original_query(processor):
+    sql = "SELECT * FROM a JOIN b ON a.id = b.id"
+    connection = FakeConnection(["id", "name", "id"], [(1, "x", 1)], fails=lambda query: query != sql)
+
+    db_index = processor._query_db_index(connection, sql, {"a": "id"}, [])
+
+    assert db_index == {("1",)}
+    assert [query for query, _ in connection.queries] == ['SELECT "id" FROM (\n' + sql + '\n) t', sql]
+    assert len(processor.logger.warnings) == 1
+
+
+def test_build_pushdown_query_binds_key_values(processor):
+    flow_data = [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}]
+
+    sql, params = processor._build_pushdown_query("SELECT * FROM t -- Kommentar", flow_data, {"a": "id", "b": "name"})
+
+    assert sql == (
+        'SELECT t."id", t."name" FROM (\nSELECT * FROM t -- Kommentar\n) t '
+        'WHERE (t."id", t."name") IN ((?, ?), (?, ?))'
+    )
+    assert params == [1, "x", 2, "y"]
+
+
+def test_build_pushdown_query_with_duplicate_mapped_columns(processor):
+    sql, params = processor._build_pushdown_query("SELECT * FROM t", [{"a": 1, "b": 1}], {"a": "id", "b": "id"})
+
+    assert sql == 'SELECT t."id", t."id" FROM (\nSELECT * FROM t\n) t WHERE (t."id", t."id") IN ((?, ?))'
+    assert params == [1, 1]
+
+
+@pytest.mark.parametrize("flow_data, expected", [
+    ([{"a": 1, "b": "x"}], True),
+    ([{"a": 1, "b": "x"}, {"a": 2}], False),
+    ([{"a": 1, "b": None}], False),
+])
+def test_has_complete_keys(processor, flow_data, expected):
+    assert processor._has_complete_keys(flow_data, {"a": "id", "b": "name"}) is expected
+
+
+def test_query_db_index_filters_in_database(processor):
+    connection = FakeConnection(["id"], [(1,)])
+
+    db_index = processor._query_db_index(connection, "SELECT * FROM t", {"a": "id"}, [{"a": 1}, {"a": 2}])
+
+    assert db_index == {("1",)}
+    assert connection.queries == [('SELECT t."id" FROM (\nSELECT * FROM t\n) t WHERE (t."id") IN ((?), (?))', [1, 2])]
+
+
+def test_query_db_index_with_null_key_uses_unfiltered_query(processor):
+    connection = FakeConnection(["id"], [(1,), (None,)])
+    flow_data = [{"a": 1}, {"a": None}]
+
+    db_index = processor._query_db_index(connection, "SELECT * FROM t", {"a": "id"}, flow_data)
+
+    assert connection.queries == [('SELECT "id" FROM (\nSELECT * FROM t\n) t', None)]
+    duplicates, non_duplicates = processor._split_duplicates(flow_data, db_index, {"a": "id"})
+    assert duplicates == flow_data
+    assert non_duplicates == []
+
+
+def _baseline_split(flow_data, db_rows, column_mapping):
+    # Vergleich wie vor der Umstellung: pandas (coerce_float) und str() je Spalte
+    db_rows = [
+        {column: float(value) if isinstance(value, Decimal) else value for column, value in row.items()}
+        for row in db_rows
+    ]
+    duplicates = []
+    non_duplicates = []
+    for item in flow_data:
+        if any(
+            all(str(item.get(flow_col)) == str(db_row.get(db_col)) for flow_col, db_col in column_mapping.items())
+            for db_row in db_rows
+        ):
+            duplicates.append(item)
+        else:
+            non_duplicates.append(item)
+    return duplicates, non_duplicates
+
+
+@pytest.mark.parametrize("column_mapping, db_rows, flow_data", [
+    ({}, [{"id": 1}], [{"a": 1}, {"a": 2}]),
+    ({}, [], [{"a": 1}]),
+    ({"a": "id", "b": "name"}, [{"id": 1, "name": None}], [{"a": 1}, {"a": 1, "b": "x"}, {"b": None}]),
+    (
+        {"a": "amount"},
+        [{"amount": Decimal("1.50")}, {"amount": Decimal("2")}],
+        [{"a": 1.5}, {"a": "1.50"}, {"a": 2}, {"a": 2.0}],
+    ),
+])
+def test_split_duplicates_matches_baseline(processor, column_mapping, db_rows, flow_data):
+    columns = ["id", "name", "amount"]
+    connection = FakeConnection(columns, [tuple(row.get(column) for column in columns) for row in db_rows])
+
+    db_index = processor._query_db_index(connection, "SELECT * FROM t", column_mapping)
+
+    assert processor._split_duplicates(flow_data, db_index, column_mapping) == _baseline_split(
+        flow_data, db_rows, column_mapping
+    )
@@ -0,0 +1,252 @@
+import pytest
+
+pytest.importorskip("orjson")
+
+from check_duplicates_service import CheckDuplicates, _subquery  # noqa: E402
+
+
+class FakeLogger:
+
+    def __init__(self):
+        self.warnings = []
+
+    def warn(self, message):
+        self.warnings.append(message)
+
+
+class FakeResultSetMetaData:
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def getColumnCount(self):
+        return len(self.columns)
+
+    def getColumnLabel(self, position):
+        return self.columns[position - 1]
+
+
+class FakeResultSet:
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = iter(rows)
+        self.row = None
+
+    def getMetaData(self):
+        return FakeResultSetMetaData(self.columns)
+
+    def next(self):
+        self.row = next(self.rows, None)
+        return self.row is not None
+
+    def getObject(self, position):
+        return self.row[position - 1]
+
+    def close(self):
+        pass
+
+
+class FakeStatement:
+
+    def __init__(self, connection, sql):
+        self.connection = connection
+        self.sql = sql
+        self.params = []
+
+    def setObject(self, position, value):
+        self.params.append(value)
+
+    def setFetchSize(self, fetch_size):
+        pass
+
+    def executeQuery(self):
+        self.connection.queries.append((self.sql, self.params))
+        if self.connection.fails(self.sql):
+            raise RuntimeError("No column name was specified for column 2 of 't'")
+        return FakeResultSet(self.connection.columns, self.connection.rows)
+
+    def close(self):
+        pass
+
+
+class FakeDatabaseMetaData:
+
+    def getIdentifierQuoteString(self):
+        return '"'
+
+
+class FakeConnection:
+
+    def __init__(self, columns, rows, fails=lambda sql: False):
+        self.columns = columns
+        self.rows = rows
+        self.fails = fails
+        self.queries = []
+        self.rolled_back = False
+        self.closed = False
+
+    def getMetaData(self):
+        return FakeDatabaseMetaData()
+
+    def prepareStatement(self, sql):
+        return FakeStatement(self, sql)
+
+    def getAutoCommit(self):
+        return False
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDBCPService:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def getConnection(self):
+        return self.connection
+
+
+@pytest.fixture
+def processor():
+    processor = CheckDuplicates()
+    processor.logger = FakeLogger()
+    return processor
+
+
+def test_subquery_keeps_trailing_comment_on_its_own_line():
+    assert _subquery("SELECT * FROM t -- letzter Stand\n") == "(\nSELECT * FROM t -- letzter Stand\n) t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE name = 'a;b'",
+    "SELECT * FROM t; -- Kommentar",
+    "WITH c AS (SELECT * FROM t) SELECT * FROM c",
+    "EXEC dbo.get_rows",
+    "CALL get_rows()",
+])
+def test_subquery_leaves_other_statements_unchanged(sql):
+    assert _subquery(sql) is None
+
+
+def test_project_query_selects_mapped_columns_once(processor):
+    projected = processor._project_query("SELECT * FROM t", {"a": "id", "b": "id", "c": "name"}, "`")
+    assert projected == "SELECT `id`, `name` FROM (\nSELECT * FROM t\n) t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t ORDER BY id",
+    "SELECT * FROM t LIMIT 10",
+    "SELECT id, name FROM t",
+    "WITH c AS (SELECT * FROM t) SELECT * FROM c",
+])
+def test_project_query_leaves_query_unchanged(processor, sql):
+    assert processor._project_query(sql, {"a": "id", "b": "name"}) == sql
+
+
+def test_query_db_index_without_filter_runs_query_unchanged(processor):
+    connection = FakeConnection(["id", "name"], [(1, "x"), (2, "y")])
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), "SELECT * FROM t", {"a": "id"})
+
+    assert db_index == {("1",), ("2",)}
+    assert connection.queries == [("SELECT * FROM t", [])]
+    assert connection.closed
+
+
+def test_query_db_index_projects_query_with_filter(processor):
+    connection = FakeConnection(["id"], [(1,)])
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), "SELECT * FROM t", {"a": "id"}, [])
+
+    assert db_index == {("1",)}
+    assert connection.queries == [('SELECT "id" FROM (\nSELECT * FROM t\n) t', [])]
+    assert processor.logger.warnings == []
+
+
+def test_query_db_index_falls_back_to_original_query(processor):
+    sql = "SELECT id, UPPER(name) FROM t"
+    connection = FakeConnection(["id", ""], [(1, "X")], fails=lambda query: query != sql)
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), sql, {"a": "id"}, [])
+
+    assert db_index == {("1",)}
+    assert [query for query, _ in connection.queries] == ['SELECT "id" FROM (\n' + sql + '\n) t', sql]
+    assert connection.rolled_back
+    assert connection.closed
+    assert len(processor.logger.warnings) == 1
+
+
+def test_build_pushdown_query_with_single_key_column(processor):
+    sql, params = processor._build_pushdown_query("SELECT * FROM t -- Kommentar", [{"a": 1}, {"a": 2}], {"a": "id"})
+
+    assert sql == 'SELECT t."id" FROM (\nSELECT * FROM t -- Kommentar\n) t WHERE t."id" IN (?, ?)'
+    assert params == [1, 2]
+
+
+def test_build_pushdown_query_expands_multi_column_keys(processor):
+    flow_data = [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}]
+
+    sql, params = processor._build_pushdown_query("SELECT * FROM t", flow_data, {"a": "id", "b": "name"}, "`")
+
+    assert sql == (
+        "SELECT t.`id`, t.`name` FROM (\nSELECT * FROM t\n) t "
+        "WHERE (t.`id` = ? AND t.`name` = ?) OR (t.`id` = ? AND t.`name` = ?)"
+    )
+    assert params == [1, "x", 2, "y"]
+
+
+def test_build_pushdown_query_with_duplicate_mapped_columns(processor):
+    sql, params = processor._build_pushdown_query("SELECT * FROM t", [{"a": 1, "b": 1}], {"a": "id", "b": "id"})
+
+    assert sql == 'SELECT t."id", t."id" FROM (\nSELECT * FROM t\n) t WHERE (t."id" = ? AND t."id" = ?)'
+    assert params == [1, 1]
+
+
+@pytest.mark.parametrize("flow_data, expected", [
+    ([{"a": 1, "b": "x"}], True),
+    ([{"a": 1, "b": "x"}, {"a": 2}], False),
+    ([{"a": 1, "b": None}], False),
+])
+def test_has_complete_keys(processor, flow_data, expected):
+    assert processor._has_complete_keys(flow_data, {"a": "id", "b": "name"}) is expected
+
+
+def test_query_db_index_filters_in_database(processor):
+    connection = FakeConnection(["id"], [(1,)])
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), "SELECT * FROM t", {"a": "id"}, [{"a": 1}])
+
+    assert db_index == {("1",)}
+    assert connection.queries == [('SELECT t."id" FROM (\nSELECT * FROM t\n) t WHERE t."id" IN (?)', [1])]
+
+
+def test_query_db_index_with_null_key_uses_unfiltered_query(processor):
+    connection = FakeConnection(["id"], [(1,), (None,)])
+    flow_data = [{"a": 1}, {"b": 2}]
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), "SELECT * FROM t", {"a": "id"}, flow_data)
+
+    assert connection.queries == [('SELECT "id" FROM (\nSELECT * FROM t\n) t', [])]
+    duplicates, non_duplicates = processor._split_duplicates(flow_data, db_index, {"a": "id"})
+    assert duplicates == flow_data
+    assert non_duplicates == []
+
+
+@pytest.mark.parametrize("column_mapping, rows, flow_data, expected", [
+    # Ohne Zuordnung ist jedes Element ein Duplikat, sobald die Abfrage Zeilen liefert
+    ({}, [(1, "x")], [{"a": 1}], ([{"a": 1}], [])),
+    ({}, [], [{"a": 1}], ([], [{"a": 1}])),
+    # Fehlende Felder werden wie bisher als 'None' mit NULL verglichen
+    ({"a": "id", "b": "name"}, [(1, None)], [{"a": 1}, {"a": 1, "b": "x"}], ([{"a": 1}], [{"a": 1, "b": "x"}])),
+])
+def test_split_duplicates(processor, column_mapping, rows, flow_data, expected):
+    connection = FakeConnection(["id", "name"], rows)
+
+    db_index = processor._query_db_index(FakeDBCPService(connection), "SELECT * FROM t", column_mapping)
+
+    assert processor._split_duplicates(flow_data, db_index, column_mapping) == expected
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+shapely = pytest.importorskip("shapely")
+pytest.importorskip("pyproj")
+
+from geojson_transform import GeoJSONTransform, _get_transformer  # noqa: E402
+
+
+def test_transform_geometries_mixed_2d_and_3d():
+    geoms = np.array([shapely.Point(9.0, 50.0, 3.0), shapely.Point(9.0, 50.0)], dtype=object)
+    transformer = _get_transformer("EPSG:4326", "EPSG:25832")
+
+    result = GeoJSONTransform()._transform_geometries(geoms, transformer)
+
+    assert shapely.has_z(result).tolist() == [True, False]
+    point_3d = shapely.get_coordinates(result[:1], include_z=True)[0]
+    point_2d = shapely.get_coordinates(result[1:])[0]
+    assert point_3d == pytest.approx([500000.0, 5538630.7027, 3.0], abs=1e-3)
+    assert point_2d == pytest.approx([500000.0, 5538630.7027], abs=1e-3)
+
+
+class FakeProperty:
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluateAttributeExpressions(self, flowfile):
+        return self
+
+    def getValue(self):
+        return self.value
+
+
+class FakeContext:
+
+    def __init__(self, properties):
+        self.properties = properties
+
+    def getProperty(self, descriptor):
+        return FakeProperty(self.properties.get(descriptor.name))
+
+
+class FakeFlowFile:
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def getContentsAsBytes(self):
+        return self.contents
+
+
+class FakeLogger:
+
+    def error(self, message):
+        pass
+
+
+def _transform(contents):
+    processor = GeoJSONTransform()
+    processor.logger = FakeLogger()
+    context = FakeContext({"Source Coordinate System": "EPSG:4326", "Target Coordinate System": "EPSG:25832"})
+    return processor.transform(context, FakeFlowFile(contents))
+
+
+def test_transform_rejects_mixed_coordinate_dimensions():
+    result = _transform(b'{"type": "LineString", "coordinates": [[9, 50, 1], [10, 51]]}')
+
+    assert result.relationship == "failure"
+
+
+def test_transform_accepts_lowercase_geometry_type():
+    result = _transform(b'{"type": "point", "coordinates": [9, 50]}')
+
+    assert result.relationship == "success"
+    wkt = shapely.from_wkt(json.loads(result.contents)["wkt"])
+    assert shapely.get_coordinates(wkt)[0] == pytest.approx([500000.0, 5538630.7027], abs=1e-3)
+
+
+def test_transform_feature_collection_falls_back_per_geometry():
+    contents = json.dumps({
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "point", "coordinates": [9, 50]}, "properties": {"id": 1}},
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [9, 50, 3]}, "properties": {"id": 2}},
+        ],
+    }).encode()
+
+    result = _transform(contents)
+
+    assert result.relationship == "success"
+    rows = json.loads(result.contents)
+    assert [row["id"] for row in rows] == [1, 2]
+    assert "nan" not in result.contents.decode().lower()